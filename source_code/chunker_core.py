@@ -6,13 +6,38 @@ Core Features:
 3. Block boundary protection (code blocks, tables)
 """
 import re
-from typing import List, Dict, Optional, Tuple
+from itertools import accumulate
+from typing import List, Dict, Optional, Tuple, Iterator
 from pathlib import Path
 
+# Markdown ATX heading on any line after the first, anchored on the preceding newline
+# so the regex engine can jump between newlines. Mirrors _match_heading on the stripped line
+_HEADING_LINE_RE = re.compile(r'\n[^\S\n]*(#{1,6})[ \t][^\S\n]*(\S(?:.*\S)?)[^\S\n]*$', re.MULTILINE)
+# Fenced code block, matched non-greedily up to the closing fence
+_CODE_BLOCK_RE = re.compile(r'```[\s\S]*?```')
+# Placeholder substituted for a protected code block
+_PLACEHOLDER_RE = re.compile(r'__CODE_BLOCK_\d+__')
+
 
 class HeadingExtractor:
     """Heading extractor"""
     
+    @staticmethod
+    def _match_heading(line_stripped: str) -> Optional[Tuple[int, str]]:
+        """Match a stripped line against Markdown ATX style (# Title) without regex"""
+        if not line_stripped or line_stripped[0] != '#':
+            return None
+        
+        # Count leading '#' (at most 6), which must be followed by whitespace
+        level = 0
+        while level < 6 and level < len(line_stripped) and line_stripped[level] == '#':
+            level += 1
+        if level >= len(line_stripped) or line_stripped[level] not in (' ', '\t'):
+            return None
+        
+        title = line_stripped[level + 1:].strip()
+        return (level, title) if title else None
+    
     @staticmethod
     def parse_headings(text: str) -> List[Tuple[int, int, str]]:
         """
@@ -21,33 +46,39 @@ class HeadingExtractor:
         Returns:
             [(line_index, level, title), ...]
         """
-        lines = text.split('\n')
         headings = []
         
-        for i, line in enumerate(lines):
-            line_stripped = line.strip()
-            if not line_stripped:
-                continue
-            
-            # Markdown ATX style: # Title
-            match = re.match(r'^(#{1,6})\s+(.+)$', line_stripped)
-            if match:
-                level = len(match.group(1))
-                title = match.group(2).strip()
-                headings.append((i, level, title))
+        # Markdown ATX style: # Title; the first line has no newline to anchor on
+        first_end = text.find('\n')
+        first = HeadingExtractor._match_heading(text[:first_end].strip() if first_end != -1 else text.strip())
+        if first:
+            level, title = first
+            headings.append((0, level, title))
+        
+        # Scan the remaining lines in one regex pass without splitting the text
+        line_index = 0
+        counted_to = 0
+        for m in _HEADING_LINE_RE.finditer(text):
+            line_index += text.count('\n', counted_to, m.start() + 1)
+            counted_to = m.start() + 1
+            headings.append((line_index, len(m.group(1)), m.group(2)))
         
         return headings
     
     @staticmethod
     def extract_heading_from_chunk(chunk_text: str) -> Dict:
         """Extract heading information from chunk text"""
-        for line in chunk_text.split('\n')[:5]:
-            match = re.match(r'^(#{1,6})\s+(.+)$', line.strip())
+        # Only the first 5 lines matter, so stop splitting there
+        for line in chunk_text.split('\n', 5)[:5]:
+            line_stripped = line.lstrip()
+            if not line_stripped.startswith('#'):
+                continue
+            match = HeadingExtractor._match_heading(line_stripped.rstrip())
             if match:
                 return {
                     'has_heading': True,
-                    'heading': match.group(2).strip(),
-                    'level': len(match.group(1))
+                    'heading': match[1],
+                    'level': match[0]
                 }
         return {'has_heading': False, 'heading': '', 'level': 0}
 
@@ -72,25 +103,38 @@ class StructuredChunker:
         Returns:
             List[Dict]: List of chunks containing content and metadata
         """
+        # Split lines once and share them across all passes
+        lines = text.split('\n')
+        
         if not headings:
             chunks_data = self._split_by_paragraph(text)
         else:
-            chunks_data = self._split_by_headings(text, headings)
-        
-        # Merge short chunks
-        chunks_data = self._merge_short_chunks(chunks_data)
+            chunks_data = self._split_by_headings(text, headings, lines)
         
-        # Apply overlap
-        if self.chunk_overlap > 0 and len(chunks_data) > 1:
-            chunks_data = self._apply_overlap(chunks_data)
+        # Heading paths depend only on the headings, so build them once
+        heading_paths = self._compute_all_paths(headings)
         
-        # Inject breadcrumb paths
+        # Merge short chunks, apply overlap and inject breadcrumb paths in a single pass.
+        # Overlap needs the next merged chunk, so keep one chunk of lookahead
+        merged_chunks = self._merge_short_chunks(chunks_data)
+        file_suffix = Path(file_path).suffix
+        file_format = file_suffix[1:] if file_suffix else 'txt'
         final_chunks = []
         previous_heading_path = None
+        previous_tail = None
         
-        for i, chunk_data in enumerate(chunks_data):
+        chunk_data = next(merged_chunks, None)
+        while chunk_data is not None:
+            following = next(merged_chunks, None)
+            i = len(final_chunks)
             content = chunk_data.get('content', '')
             
+            # Apply overlap; each chunk's head and tail are cut once, not re-split per neighbour
+            if self.chunk_overlap > 0:
+                next_head = self._overlap_head(following.get('content', '')) if following is not None else None
+                content = self._apply_overlap(content, previous_tail, next_head)
+                previous_tail = self._overlap_tail(chunk_data.get('content', ''))
+            
             # Extract heading information
             heading_info = chunk_data.get('heading_info', {})
             if not heading_info:
@@ -98,7 +142,7 @@ class StructuredChunker:
             
             # Build heading path
             current_heading_path = self._build_heading_path(
-                content, heading_info, headings, text.split('\n')
+                heading_info, headings, heading_paths
             )
             
             # If current chunk has no heading, inherit from previous chunk
@@ -118,7 +162,7 @@ class StructuredChunker:
             
             # Build metadata
             metadata = {
-                'format': Path(file_path).suffix[1:] if Path(file_path).suffix else 'txt',
+                'format': file_format,
                 'source_file': file_path,
                 'chunk_id': i,
                 'inherited_heading': not heading_info.get('has_heading', False) and previous_heading_path is not None
@@ -141,54 +185,82 @@ class StructuredChunker:
             # Update previous_heading_path
             if heading_info.get('has_heading') and current_heading_path:
                 previous_heading_path = current_heading_path
+            
+            chunk_data = following
         
         return final_chunks
     
     def _split_by_headings(
         self,
         text: str,
-        headings: List[Tuple[int, int, str]]
+        headings: List[Tuple[int, int, str]],
+        lines: Optional[List[str]] = None
     ) -> List[Dict]:
         """Split text based on headings"""
-        lines = text.split('\n')
+        if lines is None:
+            lines = text.split('\n')
         chunks = []
         current_chunk = []
         current_size = 0
+        current_start = 0
+        
+        # Column view of the heading table, so the section scans index flat lists
+        line_idxs = [h[0] for h in headings]
+        levels = [h[1] for h in headings]
+        
+        # A section ends at the next heading of the same or higher level. Find it for
+        # every heading in one reverse scan with a stack of candidate successors
+        end_lines = [len(lines)] * len(levels)
+        stack: List[int] = []
+        for i in range(len(levels) - 1, -1, -1):
+            while stack and levels[stack[-1]] > levels[i]:
+                stack.pop()
+            if stack:
+                end_lines[i] = line_idxs[stack[-1]]
+            stack.append(i)
+        
+        # Character offset where each line starts, so a section is one slice of the text
+        line_starts = [0]
+        line_starts.extend(accumulate(len(line) + 1 for line in lines))
         
         # Process each heading section
-        for i, (start_line, level, title) in enumerate(headings):
-            end_line = next(
-                (headings[j][0] for j in range(i + 1, len(headings)) if headings[j][1] <= level),
-                len(lines)
-            )
-            section_text = '\n'.join(lines[start_line:end_line]).strip()
+        chunk_size = self.chunk_size
+        for start_line, end_line in zip(line_idxs, end_lines):
+            section_text = text[line_starts[start_line]:line_starts[end_line]].strip()
             section_size = len(section_text)
             
-            if section_size <= self.chunk_size:
-                if current_size + section_size <= self.chunk_size:
+            if section_size <= chunk_size:
+                if current_size + section_size <= chunk_size:
+                    if not current_chunk:
+                        current_start = start_line
                     current_chunk.append(section_text)
                     current_size += section_size
                 else:
                     if current_chunk:
                         chunk_content = '\n\n'.join(current_chunk)
                         heading_info = HeadingExtractor.extract_heading_from_chunk(chunk_content)
+                        heading_info['line_index'] = current_start
                         chunks.append({'content': chunk_content, 'heading_info': heading_info})
-                    current_chunk, current_size = [section_text], section_size
+                    current_chunk, current_size, current_start = [section_text], section_size, start_line
             else:
                 if current_chunk:
                     chunk_content = '\n\n'.join(current_chunk)
                     heading_info = HeadingExtractor.extract_heading_from_chunk(chunk_content)
+                    heading_info['line_index'] = current_start
                     chunks.append({'content': chunk_content, 'heading_info': heading_info})
                     current_chunk, current_size = [], 0
                 
-                # Split long sections by paragraphs
-                for chunk in self._split_by_paragraph(section_text):
+                # Split long sections by paragraphs; the first piece starts with the section heading
+                for j, chunk in enumerate(self._split_by_paragraph(section_text)):
+                    if j == 0:
+                        chunk['heading_info']['line_index'] = start_line
                     chunks.append(chunk)
         
         # Save last chunk
         if current_chunk:
             chunk_content = '\n\n'.join(current_chunk)
             heading_info = HeadingExtractor.extract_heading_from_chunk(chunk_content)
+            heading_info['line_index'] = current_start
             chunks.append({'content': chunk_content, 'heading_info': heading_info})
         
         return chunks
@@ -202,12 +274,13 @@ class StructuredChunker:
         chunks = []
         current_chunk = []
         current_size = 0
+        chunk_size = self.chunk_size
         
         for para in paragraphs:
             para_restored = self._restore_code_blocks(para, block_map)
             para_size = len(para_restored)
             
-            if current_size + para_size > self.chunk_size and current_chunk:
+            if current_size + para_size > chunk_size and current_chunk:
                 chunk_content = '\n\n'.join(current_chunk)
                 heading_info = HeadingExtractor.extract_heading_from_chunk(chunk_content)
                 chunks.append({'content': chunk_content, 'heading_info': heading_info})
@@ -227,110 +300,119 @@ class StructuredChunker:
     def _protect_code_blocks(self, text: str) -> Tuple[str, Dict[str, str]]:
         """Protect code blocks to avoid splitting inside them"""
         block_map = {}
-        protected_text = text
-        block_id = 0
+        parts = []
+        last_end = 0
         
-        # Match code blocks
-        pattern = r'```[\s\S]*?```'
-        for match in re.finditer(pattern, text):
-            placeholder = f"__CODE_BLOCK_{block_id}__"
+        # Match code blocks and rebuild the text once from the gaps between them
+        for match in _CODE_BLOCK_RE.finditer(text):
+            placeholder = f"__CODE_BLOCK_{len(block_map)}__"
             block_map[placeholder] = match.group(0)
-            protected_text = protected_text.replace(match.group(0), placeholder, 1)
-            block_id += 1
+            parts.append(text[last_end:match.start()])
+            parts.append(placeholder)
+            last_end = match.end()
+        
+        if not block_map:
+            return text, block_map
         
-        return protected_text, block_map
+        parts.append(text[last_end:])
+        return ''.join(parts), block_map
     
     def _restore_code_blocks(self, text: str, block_map: Dict[str, str]) -> str:
         """Restore code blocks"""
-        restored = text
-        for placeholder, code_block in block_map.items():
-            restored = restored.replace(placeholder, code_block)
-        return restored
+        # Most paragraphs hold no code block; a substring test is far cheaper than sub()
+        if not block_map or '__CODE_BLOCK_' not in text:
+            return text
+        return _PLACEHOLDER_RE.sub(lambda m: block_map.get(m.group(0), m.group(0)), text)
+    
+    def _compute_all_paths(
+        self,
+        headings: List[Tuple[int, int, str]]
+    ) -> Dict[int, List[Tuple[int, str]]]:
+        """Compute the complete heading path of every heading, keyed by line index"""
+        paths = {}
+        # Walk headings in document order keeping a stack of open ancestors
+        stack: List[Tuple[int, str]] = []
+        for idx, level, title in headings:
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, title))
+            paths[idx] = list(stack)
+        return paths
     
     def _build_heading_path(
         self,
-        content: str,
         heading_info: Dict,
         all_headings: List[Tuple[int, int, str]],
-        text_lines: List[str]
+        heading_paths: Dict[int, List[Tuple[int, str]]]
     ) -> List[Tuple[int, str]]:
         """Build complete heading path (including all parent headings)"""
         if not heading_info.get('has_heading'):
             return []
         
+        line_index = heading_info.get('line_index')
+        if line_index in heading_paths:
+            return heading_paths[line_index]
+        
+        # Source heading unknown: fall back to the first heading with the same level and title
         current_level = heading_info.get('level', 0)
         current_title = heading_info.get('heading', '')
-        
-        # Find current heading position in all_headings
-        path = []
         for idx, level, title in all_headings:
-            if title == current_title and level == current_level:
-                # Find all parent headings
-                for parent_idx, parent_level, parent_title in all_headings:
-                    if parent_idx < idx and parent_level < level:
-                        # Check if direct parent
-                        is_direct_parent = True
-                        for check_idx, check_level, _ in all_headings:
-                            if parent_idx < check_idx < idx and parent_level < check_level < level:
-                                is_direct_parent = False
-                                break
-                        if is_direct_parent:
-                            path.append((parent_level, parent_title))
-                path.append((level, title))
-                break
-        
-        return path if path else [(current_level, current_title)]
+            if level == current_level and title == current_title:
+                return heading_paths[idx]
+        
+        return [(current_level, current_title)]
     
-    def _merge_short_chunks(self, chunks_data: List[Dict]) -> List[Dict]:
-        """Merge short chunks"""
+    def _merge_short_chunks(self, chunks_data: List[Dict]) -> Iterator[Dict]:
+        """Merge short chunks, yielding each merged chunk as soon as it is complete"""
         if not chunks_data:
-            return []
+            return
         
-        merged = []
         current_chunk = chunks_data[0]
+        # Buffer merged contents and join once per run instead of re-concatenating
+        current_parts = [current_chunk.get('content', '')]
+        current_len = len(current_parts[0])
+        chunk_size = self.chunk_size
         
         for next_chunk in chunks_data[1:]:
-            current_size = len(current_chunk.get('content', ''))
-            next_size = len(next_chunk.get('content', ''))
+            next_content = next_chunk.get('content', '')
+            next_size = len(next_content)
             
-            if current_size + next_size <= self.chunk_size:
+            if current_len + next_size <= chunk_size:
                 # Merge
-                current_content = current_chunk.get('content', '')
-                next_content = next_chunk.get('content', '')
-                current_chunk['content'] = f"{current_content}\n\n{next_content}"
+                current_parts.append(next_content)
+                current_len += 2 + next_size
             else:
-                merged.append(current_chunk)
+                if len(current_parts) > 1:
+                    current_chunk['content'] = '\n\n'.join(current_parts)
+                yield current_chunk
                 current_chunk = next_chunk
+                current_parts, current_len = [next_content], next_size
         
-        merged.append(current_chunk)
-        return merged
+        if len(current_parts) > 1:
+            current_chunk['content'] = '\n\n'.join(current_parts)
+        yield current_chunk
     
-    def _apply_overlap(self, chunks_data: List[Dict]) -> List[Dict]:
-        """Apply overlap"""
-        if len(chunks_data) <= 1:
-            return chunks_data
-        
-        overlapped = []
-        for i, chunk in enumerate(chunks_data):
-            content = chunk.get('content', '')
-            
-            # Add previous chunk tail
-            if i > 0:
-                prev_content = chunks_data[i-1].get('content', '')
-                prev_lines = prev_content.split('\n')
-                overlap_lines = prev_lines[-self.chunk_overlap:] if len(prev_lines) > self.chunk_overlap else prev_lines
-                overlap_text = '\n'.join(overlap_lines)
-                content = f"{overlap_text}\n\n{content}"
-            
-            # Add next chunk head
-            if i < len(chunks_data) - 1:
-                next_content = chunks_data[i+1].get('content', '')
-                next_lines = next_content.split('\n')
-                overlap_lines = next_lines[:self.chunk_overlap] if len(next_lines) > self.chunk_overlap else next_lines
-                overlap_text = '\n'.join(overlap_lines)
-                content = f"{content}\n\n{overlap_text}"
-            
-            overlapped.append({**chunk, 'content': content})
+    def _overlap_head(self, content: str) -> str:
+        """First chunk_overlap lines of a chunk, splitting no further than needed"""
+        return '\n'.join(content.split('\n', self.chunk_overlap)[:self.chunk_overlap])
+    
+    def _overlap_tail(self, content: str) -> str:
+        """Last chunk_overlap lines of a chunk, splitting no further than needed"""
+        return '\n'.join(content.rsplit('\n', self.chunk_overlap)[-self.chunk_overlap:])
+    
+    def _apply_overlap(
+        self,
+        content: str,
+        prev_tail: Optional[str],
+        next_head: Optional[str]
+    ) -> str:
+        """Apply overlap from the neighbouring chunks (None when there is no neighbour)"""
+        # Add previous chunk tail
+        if prev_tail is not None:
+            content = f"{prev_tail}\n\n{content}"
         
-        return overlapped
-
+        # Add next chunk head
+        if next_head is not None:
+            content = f"{content}\n\n{next_head}"
+        
+        return content
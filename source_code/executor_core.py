@@ -6,10 +6,18 @@ Core Functions:
 """
 from typing import List, Dict, Any, Optional, Callable
 import json
+import re
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Planner keyword classes, found in a single scan. Every keyword starts with a
+# different character, so the lookahead reports each (even overlapping) occurrence
+_PLAN_RE = re.compile(
+    r'(?=(?P<build_index>build index)|(?P<index>index)|(?P<http>http)|(?P<calc>calculate)'
+    r'|(?P<search>search|query|find|retrieve|lookup)|(?P<op>[+\-*/%]))'
+)
+
 
 class ExecutorCore:
     """Executor core: unified execution of tool and LLM tasks"""
@@ -26,6 +34,8 @@ class ExecutorCore:
         """Execute task sequence"""
         outputs = []
         tool_texts = []
+        # Set lookup for the per-task permission check
+        allowed = frozenset(allowed_tools) if allowed_tools is not None else None
         
         for t in tasks:
             if t['type'] == 'tool':
@@ -42,7 +52,7 @@ class ExecutorCore:
                     continue
                 
                 # Check tool permissions
-                if allowed_tools is not None and name not in allowed_tools:
+                if allowed is not None and name not in allowed:
                     outputs.append({'ok': False, 'tool_blocked': True, 'name': name})
                     continue
                 
@@ -80,9 +90,10 @@ class PlannerCore:
         """Simple planner: keyword-based matching"""
         tasks = []
         low = user_input.lower()
+        kinds = {m.lastgroup for m in _PLAN_RE.finditer(low)}
         
         # Index creation
-        if 'build index' in low or ('index' in low and 'http' in low):
+        if 'build_index' in kinds or ('index' in kinds and 'http' in kinds):
             parts = user_input.split()
             repo_url = None
             for p in parts:
@@ -103,14 +114,14 @@ class PlannerCore:
                 return tasks
         
         # Math calculation
-        if 'calculate' in low or (any(ch in low for ch in ['+', '-', '*', '/', '%']) and any(c.isdigit() for c in low)):
+        if 'calc' in kinds or ('op' in kinds and any(c.isdigit() for c in low)):
             expr = ''.join([c for c in user_input if c in '0123456789+-*/(). %^'])
             tasks.append({'type': 'tool', 'name': 'calculator', 'args': {'expr': expr}})
             tasks.append({'type': 'llm', 'args': {'prompt': 'Please provide suggestions based on the calculation result.'}})
             return tasks
         
         # Document retrieval
-        if any(k in low for k in ['search', 'query', 'find', 'retrieve', 'lookup']):
+        if 'search' in kinds:
             tasks.append({
                 'type': 'tool',
                 'name': 'query_index',
@@ -7,52 +7,126 @@ Core Features:
 """
 import os
 import logging
+import importlib.util
 from typing import List, Dict, Any, Optional, Tuple
 
-try:
-    import tiktoken
-    HAS_TIKTOKEN = True
-except ImportError:
-    HAS_TIKTOKEN = False
+# tiktoken is imported on first use: importing it and loading the BPE data is slow,
+# and callers that only plan or chunk never need it
+HAS_TIKTOKEN = importlib.util.find_spec("tiktoken") is not None
+
+# Loaded encodings by name (None if loading failed), shared by all TokenCounter instances
+_ENCODING_CACHE: Dict[str, Any] = {}
+# System prompt token counts by (encoding name, prompt), shared by all DynamicMemoryCore instances;
+# bounded because prompts often embed per-user or per-date text
+_SYSTEM_PROMPT_TOKENS: Dict[Tuple[str, str], int] = {}
+_SYSTEM_PROMPT_CACHE_SIZE = 256
+# Marks a TokenCounter encoding that has not been loaded yet (None means "no tokenizer")
+_NOT_LOADED: Any = object()
+
+
+def _get_encoding(name: str = "cl100k_base"):
+    """Load a tiktoken encoding on first call and share it afterwards"""
+    if name not in _ENCODING_CACHE:
+        encoding = None
+        if HAS_TIKTOKEN:
+            try:
+                import tiktoken
+                encoding = tiktoken.get_encoding(name)
+            except Exception:
+                encoding = None
+        _ENCODING_CACHE[name] = encoding
+    return _ENCODING_CACHE[name]
 
 
 class TokenCounter:
     """Token counter"""
     
-    def __init__(self, model: str = "deepseek-chat"):
+    def __init__(self, model: str = "deepseek-chat", cache_size: int = 4096):
         self.model = model
-        self.encoding = None
-        
-        if HAS_TIKTOKEN:
-            try:
-                if "deepseek" in model.lower() or "gpt" in model.lower():
-                    self.encoding = tiktoken.get_encoding("cl100k_base")
-                else:
-                    self.encoding = tiktoken.get_encoding("cl100k_base")
-            except Exception:
-                self.encoding = None
+        self.encoding_name = "cl100k_base"
+        self._encoding = _NOT_LOADED
+        # Token counts keyed by text, so repeated message contents are encoded only once
+        self.cache_size = cache_size
+        self._cache: Dict[str, int] = {}
+    
+    @property
+    def encoding(self):
+        """Tokenizer encoding, loaded lazily on first use (None if unavailable)"""
+        if self._encoding is _NOT_LOADED:
+            self._encoding = _get_encoding(self.encoding_name)
+        return self._encoding
+    
+    @encoding.setter
+    def encoding(self, value):
+        # Assigning None forces the character-estimate fallback; cached counts came from the old encoding
+        self._encoding = value
+        self._cache.clear()
     
     def count(self, text: str) -> int:
         """Count tokens in text"""
         if not text:
             return 0
         
+        cached = self._cache.get(text)
+        if cached is not None:
+            return cached
+        
+        tokens = None
         if self.encoding:
             try:
-                return len(self.encoding.encode(text))
+                # encode_ordinary skips the special-token scan done by encode
+                tokens = len(self.encoding.encode_ordinary(text))
+            except Exception:
+                pass
+        
+        if tokens is None:
+            # Fallback: character count estimation
+            tokens = int(len(text) / 2.5)
+        
+        self._remember(text, tokens)
+        return tokens
+    
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """Count tokens for each text, encoding all uncached texts in one batch call"""
+        missing = [text for text in dict.fromkeys(texts) if text and text not in self._cache]
+        if missing and self.encoding:
+            try:
+                encoded = self.encoding.encode_ordinary_batch(missing, num_threads=os.cpu_count() or 1)
+                for text, tokens in zip(missing, encoded):
+                    self._remember(text, len(tokens))
             except Exception:
                 pass
         
-        # Fallback: character count estimation
-        return int(len(text) / 2.5)
+        return [self.count(text) for text in texts]
     
     def count_messages(self, messages: List[Dict[str, Any]]) -> int:
         """Count total tokens in message list"""
-        total = 0
-        for msg in messages:
-            total += 6  # Base overhead
-            total += self.count(str(msg.get("content", "")))
-        return total
+        texts = [str(msg.get("content", "")) for msg in messages]
+        # 6 tokens of base overhead per message
+        return 6 * len(messages) + sum(self.count_batch(texts))
+    
+    def _remember(self, text: str, tokens: int) -> None:
+        """Store a token count in the bounded cache"""
+        if self.cache_size <= 0:
+            return
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[text] = tokens
+
+
+# Role prefixes used when rendering messages as text
+_FORMAT_PREFIXES = {'user': 'User: ', 'assistant': 'AI: ', 'system': '[System] '}
+_SUMMARY_PREFIXES = {'user': 'User: ', 'assistant': 'Assistant: '}
+
+
+class _Msg:
+    """Slotted view of a message dict: attribute access and a lazily counted token size"""
+    __slots__ = ('role', 'content', 'tokens')
+    
+    def __init__(self, role: str, content: str, tokens: Optional[int] = None):
+        self.role = role
+        self.content = content
+        self.tokens = tokens
 
 
 class DynamicMemoryCore:
@@ -72,7 +146,14 @@ class DynamicMemoryCore:
         self.llm = llm
         
         self.max_context_tokens = max_context_tokens
-        self.system_prompt_tokens = self.token_counter.count(system_prompt)
+        prompt_key = (self.token_counter.encoding_name, system_prompt)
+        prompt_tokens = _SYSTEM_PROMPT_TOKENS.get(prompt_key)
+        if prompt_tokens is None:
+            prompt_tokens = self.token_counter.count(system_prompt)
+            if len(_SYSTEM_PROMPT_TOKENS) >= _SYSTEM_PROMPT_CACHE_SIZE:
+                _SYSTEM_PROMPT_TOKENS.clear()
+            _SYSTEM_PROMPT_TOKENS[prompt_key] = prompt_tokens
+        self.system_prompt_tokens = prompt_tokens
         # Reserve 20% safety margin + System Prompt
         self.reserved_tokens = int(self.max_context_tokens * 0.2) + self.system_prompt_tokens
         self.available_tokens = self.max_context_tokens - self.reserved_tokens
@@ -101,8 +182,20 @@ class DynamicMemoryCore:
                 'remaining_tokens': remaining_tokens
             }
         
+        # Wrap messages once so later passes use attributes instead of dict lookups
+        wrapped = [_Msg(msg.get("role", ""), str(msg.get("content", ""))) for msg in messages]
+        
+        # Fast path: the whole history fits, so skip grouping and compression
+        total_tokens = self._count_tokens(wrapped)
+        if total_tokens <= remaining_tokens:
+            return self._format_messages(wrapped), {
+                'strategy': 'all_fit',
+                'messages_tokens': total_tokens,
+                'remaining_tokens': remaining_tokens - total_tokens
+            }
+        
         # Group messages by turns
-        message_pairs = self._group_messages_by_turns(messages)
+        message_pairs = self._group_messages_by_turns(wrapped)
         
         # Strategy: near-field full retention, far-field compression
         near_field_pairs = message_pairs[-self.near_field_turns:] if len(message_pairs) > self.near_field_turns else message_pairs
@@ -110,14 +203,14 @@ class DynamicMemoryCore:
         
         # Calculate near-field message tokens
         near_field_messages = [msg for pair in near_field_pairs for msg in pair]
-        near_field_tokens = self.token_counter.count_messages(near_field_messages)
+        near_field_tokens = self._count_tokens(near_field_messages)
         
         # If near-field messages exceed limit, keep only recent turns
         if near_field_tokens > remaining_tokens:
             selected_pairs = []
             selected_tokens = 0
             for pair in reversed(near_field_pairs):
-                pair_tokens = self.token_counter.count_messages(pair)
+                pair_tokens = self._count_tokens(pair)
                 if selected_tokens + pair_tokens <= remaining_tokens:
                     selected_pairs.insert(0, pair)
                     selected_tokens += pair_tokens
@@ -143,9 +236,7 @@ class DynamicMemoryCore:
             if compressed_summary:
                 summary_tokens = self.token_counter.count(compressed_summary)
                 if summary_tokens <= remaining_after_near:
-                    all_messages = near_field_messages + [
-                        {'role': 'system', 'content': compressed_summary}
-                    ]
+                    all_messages = near_field_messages + [_Msg('system', compressed_summary)]
                     context_text = self._format_messages(all_messages)
                     
                     return context_text, {
@@ -163,13 +254,22 @@ class DynamicMemoryCore:
             'remaining_tokens': remaining_tokens - near_field_tokens
         }
     
-    def _group_messages_by_turns(self, messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    def _count_tokens(self, messages: List[_Msg]) -> int:
+        """Count tokens of wrapped messages, counting each message at most once"""
+        missing = [msg for msg in messages if msg.tokens is None]
+        if missing:
+            counts = self.token_counter.count_batch([msg.content for msg in missing])
+            for msg, tokens in zip(missing, counts):
+                msg.tokens = tokens + 6  # Base overhead
+        return sum(msg.tokens for msg in messages)
+    
+    def _group_messages_by_turns(self, messages: List[_Msg]) -> List[List[_Msg]]:
         """Group messages by turns (each turn = user + assistant)"""
         pairs = []
         current_pair = []
         
         for msg in messages:
-            role = msg.get("role", "")
+            role = msg.role
             if role == "user":
                 if current_pair:
                     pairs.append(current_pair)
@@ -186,7 +286,7 @@ class DynamicMemoryCore:
     
     def _compress_far_field(
         self,
-        far_field_pairs: List[List[Dict[str, Any]]],
+        far_field_pairs: List[List[_Msg]],
         max_tokens: int,
     ) -> Optional[str]:
         """Compress far-field messages and generate semantic summary"""
@@ -194,17 +294,12 @@ class DynamicMemoryCore:
             return None
         
         # Extract far-field message content
-        far_field_text = []
-        for pair in far_field_pairs:
-            for msg in pair:
-                role = msg.get("role", "")
-                content = msg.get("content", "")
-                if role == "user":
-                    far_field_text.append(f"User: {content}")
-                elif role == "assistant":
-                    far_field_text.append(f"Assistant: {content}")
-        
-        far_field_content = "\n".join(far_field_text)
+        prefixes = _SUMMARY_PREFIXES
+        far_field_content = "\n".join(
+            prefixes[msg.role] + msg.content
+            for pair in far_field_pairs for msg in pair
+            if msg.role in prefixes
+        )
         
         # Use LLM to generate summary
         prompt = f"""Please compress the following conversation history into a concise summary, preserving key information:
@@ -220,18 +315,12 @@ Summary:"""
             self.logger.error(f"Failed to compress far-field messages: {e}")
             return None
     
-    def _format_messages(self, messages: List[Dict[str, Any]]) -> str:
+    def _format_messages(self, messages: List[_Msg]) -> str:
         """Format messages as text"""
-        formatted = []
-        for msg in messages:
-            role = msg.get("role", "")
-            content = msg.get("content", "")
-            if role == "user":
-                formatted.append(f"User: {content}")
-            elif role == "assistant":
-                formatted.append(f"AI: {content}")
-            elif role == "system":
-                formatted.append(f"[System] {content}")
-        
-        return "\n".join(formatted)
+        prefixes = _FORMAT_PREFIXES
+        return "\n".join(
+            prefixes[msg.role] + msg.content
+            for msg in messages
+            if msg.role in prefixes
+        )
 
@@ -6,180 +6,693 @@ Core Flow:
 3. Observation: Observe tool execution results
 4. Loop until task completion
 """
-from typing import List, Dict, Any, Optional, Iterator, Callable
+from typing import List, Dict, Any, Optional, Iterator, Callable, Hashable, Tuple, Set, Deque, Sequence, ClassVar
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+import asyncio
+import hashlib
+import inspect
 import json
 import re
+import string
 import logging
+import threading
+import time
+import math
+
+try:
+    import hnswlib  # type: ignore[import-untyped, import-not-found]
+    HAS_HNSWLIB = True
+except ImportError:
+    HAS_HNSWLIB = False
+
+try:
+    import orjson  # type: ignore[import-untyped, import-not-found]
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    from mypy_extensions import mypyc_attr
+except ImportError:
+    def mypyc_attr(*attrs: str, **kwattrs: Any) -> Callable[[Any], Any]:  # type: ignore[misc]
+        """No-op stand-in when mypy_extensions is not installed"""
+        return lambda cls: cls
 
 logger = logging.getLogger(__name__)
 
 
+def _json_dumps(obj: Any) -> str:
+    """Serialize to compact UTF-8 JSON text
+    
+    orjson and json agree on strings, ints and containers, but not on every float:
+    orjson writes 2.5e20 where json writes 2.5e+20, and NaN/Infinity as null.
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _json_loads(text: str) -> Any:
+    """Parse JSON text, with orjson when available"""
+    if HAS_ORJSON:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+@lru_cache(maxsize=1024)
+def _first_doc_line(doc: Optional[str]) -> str:
+    """First line of a tool docstring, used as its description"""
+    return (doc or "No description").strip().split('\n', 1)[0]
+
+
+def _signature_accepts(func: Callable, name: str) -> bool:
+    """Check whether a callable's signature takes the keyword argument `name`"""
+    try:
+        params = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+    return name in params or any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values())
+
+
+_function_accepts = lru_cache(maxsize=256)(_signature_accepts)
+
+
+def _accepts_kwarg(func: Callable, name: str) -> bool:
+    """Check whether a callable accepts the keyword argument `name`"""
+    # Cache on the underlying plain function only: bound methods and callable instances may be
+    # unhashable, and caching them would keep their LLM objects alive
+    target = getattr(func, '__func__', func)
+    if not inspect.isfunction(target):
+        target = getattr(type(func), '__call__', None)
+        if not inspect.isfunction(target):
+            return _signature_accepts(func, name)
+    return _function_accepts(target, name)
+
+
+class _LRUCache:
+    """Thread-safe LRU cache with optional TTL (seconds)"""
+    
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None on miss or expiry"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class _SemanticSpace:
+    """Embeddings and responses for one cache namespace, with FIFO eviction"""
+    
+    def __init__(self, dim: int, max_entries: int):
+        self.dim = dim
+        self.responses: Dict[int, str] = {}
+        self.vectors: Dict[int, List[float]] = {}
+        self.order: deque = deque()
+        self.next_label = 0
+        self.index = None
+        if HAS_HNSWLIB:
+            self.index = hnswlib.Index(space='cosine', dim=dim)
+            self.index.init_index(max_elements=max_entries, allow_replace_deleted=True)
+
+
+class SemanticCache:
+    """Embedding-similarity cache: reuses a response for a near-duplicate prompt
+    
+    Entries are partitioned by namespace (e.g. the available tool set) so prompts with
+    different constraints never match. Uses hnswlib when installed, otherwise a linear scan.
+    """
+    
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1024):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._spaces: Dict[Hashable, _SemanticSpace] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> List[float]:
+        norm = math.sqrt(sum(x * x for x in embedding)) or 1.0
+        return [x / norm for x in embedding]
+    
+    def lookup(self, namespace: Hashable, embedding: List[float]) -> Optional[str]:
+        """Return the response of the most similar prompt if it reaches the threshold"""
+        vec = self._normalize(embedding)
+        with self._lock:
+            space = self._spaces.get(namespace)
+            if space is None or not space.responses or len(vec) != space.dim:
+                return None
+            
+            if space.index is not None:
+                labels, distances = space.index.knn_query([vec], k=1)
+                label, similarity = int(labels[0][0]), 1.0 - float(distances[0][0])
+            else:
+                label, similarity = max(
+                    ((l, sum(a * b for a, b in zip(vec, v))) for l, v in space.vectors.items()),
+                    key=lambda item: item[1]
+                )
+            
+            return space.responses.get(label) if similarity >= self.threshold else None
+    
+    def add(self, namespace: Hashable, embedding: List[float], response: str) -> None:
+        """Store a response under the prompt embedding"""
+        if self.max_entries <= 0:
+            return
+        vec = self._normalize(embedding)
+        with self._lock:
+            space = self._spaces.get(namespace)
+            if space is None:
+                space = self._spaces[namespace] = _SemanticSpace(len(vec), self.max_entries)
+            elif len(vec) != space.dim:
+                # Skip before evicting anything, so a bad vector never leaves the space half-updated
+                return
+            
+            # Evict the oldest entry when full
+            if len(space.order) >= self.max_entries:
+                oldest = space.order.popleft()
+                del space.responses[oldest]
+                if space.index is not None:
+                    space.index.mark_deleted(oldest)
+                else:
+                    del space.vectors[oldest]
+            
+            label = space.next_label
+            space.next_label += 1
+            space.responses[label] = response
+            space.order.append(label)
+            if space.index is not None:
+                space.index.add_items([vec], [label], replace_deleted=True)
+            else:
+                space.vectors[label] = vec
+
+
+@dataclass(slots=True)
+class ActionResult:
+    """Outcome of one Action: 'tool', 'error', 'finish' or 'no_action'"""
+    type: str
+    tool_name: str = ''
+    args: Optional[Dict[str, Any]] = None
+    result: Any = None
+    error: str = ''
+
+
+@dataclass(slots=True)
+class LoopState:
+    """Per-run ReAct loop state"""
+    history: Deque[str] = field(default_factory=deque)  # observations inside the prompt window
+    older: List[str] = field(default_factory=list)  # observations that slid out of the window
+    iteration: int = 0
+
+
+# Under a mypyc build, subclasses stay possible but methods can no longer be monkeypatched
+@mypyc_attr(allow_interpreted_subclasses=True)
 class ReActCore:
     """ReAct core loop implementation"""
     
-    def __init__(self, llm, tools: Dict[str, Callable], max_iterations: int = 10):
+    # Thought parsing patterns, compiled once at class load
+    _FINISH_RE: ClassVar[re.Pattern] = re.compile(r'Final Answer:|Action:\s*FINISH', re.IGNORECASE)
+    _FINAL_ANS_RE: ClassVar[re.Pattern] = re.compile(r'Final Answer:\s*(.+?)(?:\n|$)', re.IGNORECASE | re.DOTALL)
+    # One pass yields either the FINISH group or (tool name, arguments)
+    _ACTION_RE: ClassVar[re.Pattern] = re.compile(r'Action:\s*(?:(FINISH)\b|(\w+)\s*\((.+?)\))', re.IGNORECASE | re.DOTALL)
+    _KV_RE: ClassVar[re.Pattern] = re.compile(r'(\w+)\s*[:=]\s*"([^"]+)"')
+    
+    # Cut generation before the model starts inventing its own observations
+    _STOP_SEQUENCES: ClassVar[List[str]] = ["\nObservation", "\nUser query:"]
+    
+    # Prompt templates, parsed once at class load
+    _PREFIX_TPL: ClassVar[string.Template] = string.Template("""You are an intelligent assistant using ReAct mode to solve problems.
+
+Available tools:
+$tools
+
+Please follow this format for thinking and acting:
+1. Thought: [Analyze the current situation and think about what to do next]
+2. Action: [If you need to use a tool, format: tool_name({"param_name": "param_value"})]
+   or Action: FINISH [if you can directly provide the final answer]
+
+""")
+    _SUFFIX_TPL: ClassVar[string.Template] = string.Template("""User query: $query$history
+
+Please start thinking:""")
+    
+    def __init__(
+        self,
+        llm,
+        tools: Dict[str, Callable],
+        max_iterations: int = 10,
+        temperature: float = 0.3,
+        thought_cache_size: int = 1024,
+        thought_cache_ttl: Optional[float] = None,
+        embedder: Optional[Callable[[str], List[float]]] = None,
+        semantic_cache_threshold: float = 0.95,
+        history_window: Optional[int] = 5,
+        summarize_older: bool = False,
+        tool_cache_size: int = 256,
+        tool_cacheable: Optional[Set[str]] = None,
+        stream_thoughts: bool = True,
+        thought_max_tokens: Optional[int] = None,
+        parallel_actions: bool = False,
+        max_obs_chars: Optional[int] = 2000,
+    ):
         self.llm = llm
+        # Prompt prefixes per allowed-tool set and their token IDs (for backends that accept a
+        # pre-tokenized prefix); both are dropped whenever the tools are reassigned or invalidated
+        self._static_prefixes: Dict[Optional[frozenset], str] = {}
+        self._prefix_token_ids: Dict[str, List[int]] = {}
+        self._tools_key: frozenset = frozenset()
+        self._tools: Dict[str, Callable] = {}
         self.tools = tools
         self.max_iterations = max_iterations
+        self.temperature = temperature
+        # Exact-prompt Thought cache; only consulted when sampling is deterministic
+        self._thought_cache = _LRUCache(thought_cache_size, thought_cache_ttl)
+        # Optional semantic Thought cache, enabled by passing an embedder for the query and observations
+        self.embedder = embedder
+        self._semantic_cache = SemanticCache(semantic_cache_threshold, thought_cache_size) if embedder else None
+        # Only the last `history_window` observations go into the prompt verbatim (None keeps all)
+        self.history_window = history_window
+        self.summarize_older = summarize_older
+        # Summaries of observations that slid out of the window, keyed by their text
+        self._summary_cache = _LRUCache(thought_cache_size)
+        # Results of idempotent tools, opted in by name, keyed by (tool name, canonical args)
+        self.tool_cacheable = frozenset(tool_cacheable or ())
+        self._tool_cache = _LRUCache(tool_cache_size)
+        # Stream Thoughts when the backend has llm.stream(), stopping at the first complete Action
+        # (with parallel_actions the whole Thought is read, bounded only by the stop sequences)
+        self.stream_thoughts = stream_thoughts
+        self.thought_max_tokens = thought_max_tokens
+        # Run every tool Action in a Thought concurrently instead of only the first
+        self.parallel_actions = parallel_actions
+        # Tool results longer than this are truncated before entering the history (None keeps all)
+        self.max_obs_chars = max_obs_chars
+    
+    @property
+    def tools(self) -> Dict[str, Callable]:
+        """Registered tools by name"""
+        return self._tools
+    
+    @tools.setter
+    def tools(self, tools: Dict[str, Callable]) -> None:
+        self._tools = tools
+        self.invalidate_tools()
+    
+    def invalidate_tools(self) -> None:
+        """Drop everything derived from the tools; call after mutating self.tools in place"""
+        self._tools_key = frozenset(self._tools)
+        self._static_prefixes = {}
+        self._prefix_token_ids = {}
     
     def run(self, query: str, allowed_tools: Optional[List[str]] = None) -> str:
         """Execute ReAct loop"""
-        history = []
+        # Observations, each formatted once as "Observation N: ..." when appended;
+        # the bounded deque drops the oldest into state.older without any slicing
+        state = LoopState(history=deque(maxlen=self.history_window))
+        history = state.history
         
-        for i in range(self.max_iterations):
+        while state.iteration < self.max_iterations:
+            state.iteration += 1
+            
             # Thought phase
-            thought = self._think(query, history)
+            thought = self._think(query, history, allowed_tools, state.older)
             
             # Check if should finish
-            if self._should_finish(thought):
-                final_answer = self._extract_final_answer(thought)
-                if final_answer:
-                    return final_answer
+            if (final_answer := self._try_finish(thought)) is not None:
+                return final_answer
             
-            # Action phase
-            action_result = self._act(thought, allowed_tools)
-            
-            # Observation phase
-            observation = self._observe(action_result)
-            history.append(observation)
+            # Action and Observation phases
+            if self.parallel_actions:
+                observation = " | ".join(self._observe(r) for r in self._act_all(thought, allowed_tools))
+            else:
+                observation = self._observe(self._act(thought, allowed_tools))
+            entry = f"Observation {state.iteration}: {observation}"
+            if len(history) == history.maxlen:
+                state.older.append(history[0] if history else entry)
+            history.append(entry)
         
         # Reached max iterations
-        return self._generate_final_answer(query, history) if history else "Unable to complete task"
+        if not state.older and not history:
+            return "Unable to complete task"
+        return self._generate_final_answer(query, [*state.older, *history])
+    
+    def run_batch(
+        self,
+        queries: List[str],
+        allowed_tools: Optional[List[str]] = None,
+        max_workers: int = 16
+    ) -> List[str]:
+        """Execute independent ReAct loops concurrently, returning answers in query order"""
+        if not queries:
+            return []
+        
+        # LLM and tool calls are I/O bound, so threads let the loops overlap
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+            return list(executor.map(lambda q: self.run(q, allowed_tools), queries))
     
-    def _think(self, query: str, history: List[str]) -> str:
+    async def arun(self, query: str, allowed_tools: Optional[List[str]] = None) -> str:
+        """Execute ReAct loop without blocking the event loop"""
+        return await asyncio.to_thread(self.run, query, allowed_tools)
+    
+    async def arun_batch(
+        self,
+        queries: List[str],
+        allowed_tools: Optional[List[str]] = None
+    ) -> List[str]:
+        """Execute independent ReAct loops concurrently from async code"""
+        return list(await asyncio.gather(*(self.arun(q, allowed_tools) for q in queries)))
+    
+    def _think(
+        self,
+        query: str,
+        history: Sequence[str],
+        allowed_tools: Optional[List[str]] = None,
+        older: Optional[Sequence[str]] = None
+    ) -> str:
         """Generate Thought"""
-        prompt = self._build_react_prompt(query, history)
+        prefix = self._build_static_prefix(allowed_tools)
+        suffix = self._build_dynamic_suffix(query, history, older)
+        prompt = prefix + suffix
+        
+        cache_key = None
+        if self.temperature <= 0:
+            cache_key = hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+            cached = self._thought_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        # Semantic lookup, under the same deterministic-sampling gate as the exact cache. The namespace
+        # pins the tool availability (and so the static prefix); only the query and observations are
+        # embedded, so shared prompt boilerplate cannot dominate the similarity
+        embedding: Optional[List[float]] = None
+        namespace: Hashable = None
+        semantic_cache = self._semantic_cache if self.temperature <= 0 else None
+        if semantic_cache is not None and self.embedder is not None:
+            namespace = (self._tools_key, frozenset(allowed_tools) if allowed_tools is not None else None)
+            try:
+                embedding = self.embedder("\n\n".join([query, *(older or ()), *history]))
+                cached = semantic_cache.lookup(namespace, embedding)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                logger.error(f"Semantic Thought cache lookup failed: {e}")
+        
         try:
-            return self.llm.generate(prompt, temperature=0.3)
+            thought = self._generate_thought(prefix, suffix)
         except Exception as e:
             logger.error(f"Failed to generate Thought: {e}")
             return f"Thought: Encountered error, unable to continue thinking. Error: {str(e)}"
+        
+        if cache_key is not None:
+            self._thought_cache.put(cache_key, thought)
+        if embedding is not None and semantic_cache is not None:
+            try:
+                semantic_cache.add(namespace, embedding, thought)
+            except Exception as e:
+                logger.error(f"Failed to store Thought in semantic cache: {e}")
+        return thought
     
-    def _build_react_prompt(self, query: str, history: List[str]) -> str:
-        """Build ReAct format prompt"""
-        # Build tool descriptions
-        tool_descriptions = []
-        for name, func in self.tools.items():
-            doc = func.__doc__ or "No description"
-            doc_first_line = doc.strip().split('\n')[0]
-            tool_descriptions.append(f"- {name}: {doc_first_line}")
+    def _build_static_prefix(self, allowed_tools: Optional[List[str]] = None) -> str:
+        """Build the prompt prefix (instructions + tools), identical across iterations"""
+        key = frozenset(allowed_tools) if allowed_tools is not None else None
+        cached = self._static_prefixes.get(key)
+        if cached is not None:
+            return cached
         
-        tools_info = "\n".join(tool_descriptions) if tool_descriptions else "No available tools"
+        # Build tool descriptions, listing only the tools this call may use
+        tools_info = "\n".join(
+            f"- {name}: {_first_doc_line(func.__doc__)}"
+            for name, func in self.tools.items()
+            if key is None or name in key
+        ) or "No available tools"
         
-        # Build history observations
+        prefix = self._PREFIX_TPL.substitute(tools=tools_info)
+        self._static_prefixes[key] = prefix
+        return prefix
+    
+    def _build_dynamic_suffix(
+        self,
+        query: str,
+        history: Sequence[str],
+        older: Optional[Sequence[str]] = None
+    ) -> str:
+        """Build the prompt suffix (query + observations), which changes every iteration"""
+        # run() passes an already-windowed deque; a full history list is windowed here
+        if older is None:
+            older = []
+            window = self.history_window
+            if window is not None and len(history) > window:
+                older = history[:-window] if window > 0 else history
+                history = history[-window:] if window > 0 else []
+        
+        # The older-summary comes first: it only changes when the window slides, so it stays cacheable
         history_text = ""
+        if older and self.summarize_older:
+            summary = self._summarize_older(older)
+            if summary:
+                history_text = f"\n\nEarlier observations (summary): {summary}"
+        
+        # History entries are already formatted, so only the join remains per iteration
         if history:
-            history_text = "\n\n" + "\n\n".join([
-                f"Observation {i+1}: {obs}" 
-                for i, obs in enumerate(history)
-            ])
+            history_text += "\n\n" + "\n\n".join(history)
         
-        return f"""You are an intelligent assistant using ReAct mode to solve problems.
+        return self._SUFFIX_TPL.substitute(query=query, history=history_text)
+    
+    def _summarize_older(self, older: Sequence[str]) -> str:
+        """Summarize observations outside the history window, cached per set of observations"""
+        # Hash observations one by one, so the key of all but the newest falls out on the way
+        hasher = hashlib.blake2b(digest_size=16)
+        for observation in older[:-1]:
+            hasher.update(observation.encode('utf-8'))
+            hasher.update(b'\n\n')
+        previous_key = hasher.hexdigest()
+        hasher.update(older[-1].encode('utf-8'))
+        hasher.update(b'\n\n')
+        key = hasher.hexdigest()
+        
+        cached = self._summary_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # Fold only the newly evicted observation into the previous summary when there is one
+        previous = self._summary_cache.get(previous_key) if len(older) > 1 else None
+        if previous is not None:
+            text = f"Earlier summary: {previous}\n\n{older[-1]}"
+        else:
+            text = "\n\n".join(older)
+        
+        prompt = f"""Summarize the following observations in one line, keeping every fact needed to answer the user's query:
 
-Available tools:
-{tools_info}
+{text}
 
-Please follow this format for thinking and acting:
-1. Thought: [Analyze the current situation and think about what to do next]
-2. Action: [If you need to use a tool, format: tool_name({{"param_name": "param_value"}})]
-   or Action: FINISH [if you can directly provide the final answer]
-
-User query: {query}{history_text}
-
-Please start thinking:"""
-    
-    def _should_finish(self, thought: str) -> bool:
-        """Check if should finish the loop"""
-        finish_patterns = [
-            r'Final Answer:',
-            r'Action:\s*FINISH',
-        ]
-        return any(re.search(pattern, thought, re.IGNORECASE) for pattern in finish_patterns)
-    
-    def _extract_final_answer(self, thought: str) -> Optional[str]:
-        """Extract final answer from Thought"""
-        patterns = [
-            r'Final Answer:\s*(.+?)(?:\n|$)',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, thought, re.IGNORECASE | re.DOTALL)
-            if match:
-                answer = match.group(1).strip()
-                if answer:
-                    return answer
+Summary:"""
+        
+        try:
+            summary = " ".join(self.llm.generate(prompt, temperature=self.temperature).split())
+        except Exception as e:
+            logger.error(f"Failed to summarize older observations: {e}")
+            return ""
+        
+        self._summary_cache.put(key, summary)
+        return summary
+    
+    def _generate_thought(self, prefix: str, suffix: str) -> str:
+        """Call the LLM, passing the static prefix separately when the backend can cache it"""
+        # Backends taking token IDs expose a tokenizer and generate_with_prefix_ids(prefix_ids, suffix, temperature)
+        generate_with_prefix_ids = getattr(self.llm, 'generate_with_prefix_ids', None)
+        tokenizer = getattr(self.llm, 'tokenizer', None)
+        if generate_with_prefix_ids is not None and tokenizer is not None:
+            prefix_ids = self._prefix_token_ids.get(prefix)
+            if prefix_ids is None:
+                prefix_ids = self._prefix_token_ids[prefix] = tokenizer.encode(prefix)
+            return generate_with_prefix_ids(
+                prefix_ids, suffix, temperature=self.temperature,
+                **self._generation_kwargs(generate_with_prefix_ids)
+            )
+        
+        # Backends with prompt/KV prefix caching expose generate_with_prefix(prefix, suffix, temperature)
+        generate_with_prefix = getattr(self.llm, 'generate_with_prefix', None)
+        if generate_with_prefix is not None:
+            return generate_with_prefix(
+                prefix, suffix, temperature=self.temperature,
+                **self._generation_kwargs(generate_with_prefix)
+            )
+        
+        stream = getattr(self.llm, 'stream', None) if self.stream_thoughts else None
+        if callable(stream):
+            chunks = stream(prefix + suffix, temperature=self.temperature, **self._generation_kwargs(stream))
+            # Parallel actions need every Action line, so only the stop sequences may end the stream
+            if self.parallel_actions:
+                return "".join(chunks)
+            return self._collect_stream(chunks)
+        return self.llm.generate(prefix + suffix, temperature=self.temperature,
+                                 **self._generation_kwargs(self.llm.generate))
+    
+    def _generation_kwargs(self, func: Callable) -> Dict[str, Any]:
+        """Stop sequences and token cap, passed only to backends that accept them"""
+        kwargs: Dict[str, Any] = {}
+        if _accepts_kwarg(func, 'stop'):
+            kwargs['stop'] = self._STOP_SEQUENCES
+        if self.thought_max_tokens is not None and _accepts_kwarg(func, 'max_tokens'):
+            kwargs['max_tokens'] = self.thought_max_tokens
+        return kwargs
+    
+    def _collect_stream(self, chunks: Iterator[str]) -> str:
+        """Accumulate a streamed Thought, closing the stream once a complete Action or Final Answer line arrives"""
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                if '\n' not in chunk:
+                    continue
+                # Only parse whole lines, so a half-streamed Action is never acted on
+                text = "".join(parts)
+                complete = text[:text.rfind('\n')]
+                # A bare "Action: FINISH" is not a stopping point: the Final Answer usually follows it
+                tool_call = next((m for m in self._ACTION_RE.finditer(complete) if m.group(2)), None)
+                # An answer counts only once its text has arrived; "Final Answer:" then a blank line
+                # matches with a bare newline as the answer. Matching within `complete` guarantees the
+                # answer line already ended with a received newline
+                answer = self._FINAL_ANS_RE.search(complete)
+                if answer and not answer.group(1).strip():
+                    answer = None
+                ends = [m.end() for m in (tool_call, answer) if m is not None]
+                if ends:
+                    # Keep everything up to the end of the first matching line
+                    return text[:text.find('\n', min(ends) - 1)]
+            return "".join(parts)
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+    
+    def _try_finish(self, thought: str) -> Optional[str]:
+        """Return the final answer if the Thought finishes the loop, else None"""
+        finish = self._FINISH_RE.search(thought)
+        if finish is None:
+            return None
+        
+        # No "Final Answer:" can precede the first finish marker, so resume scanning there
+        match = self._FINAL_ANS_RE.search(thought, finish.start())
+        if match:
+            answer = match.group(1).strip()
+            if answer:
+                return answer
         return thought.strip()
     
-    def _act(self, thought: str, allowed_tools: Optional[List[str]] = None) -> Dict[str, Any]:
+    def _act(self, thought: str, allowed_tools: Optional[List[str]] = None) -> ActionResult:
         """Execute Action"""
         # Parse Action
-        action_match = re.search(
-            r'Action:\s*(\w+)\s*\((.+?)\)',
-            thought,
-            re.IGNORECASE | re.DOTALL
-        )
+        action_match = self._ACTION_RE.search(thought)
         
         if not action_match:
-            if re.search(r'Action:\s*FINISH', thought, re.IGNORECASE):
-                return {'type': 'finish', 'action': 'FINISH'}
-            return {'type': 'no_action', 'error': 'No valid Action found'}
+            return ActionResult('no_action', error='No valid Action found')
+        if action_match.group(1):
+            return ActionResult('finish')
         
-        tool_name = action_match.group(1).strip()
-        args_str = action_match.group(2).strip()
+        return self._run_action(action_match.group(2), action_match.group(3).strip(), allowed_tools)
+    
+    def _act_all(self, thought: str, allowed_tools: Optional[List[str]] = None) -> List[ActionResult]:
+        """Execute every tool Action in the Thought, dispatching them concurrently"""
+        actions = [(m.group(2), m.group(3).strip()) for m in self._ACTION_RE.finditer(thought) if not m.group(1)]
+        if len(actions) <= 1:
+            return [self._act(thought, allowed_tools)]
         
+        # Tool calls are I/O bound, so a round costs the slowest call rather than the sum
+        with ThreadPoolExecutor(max_workers=min(len(actions), 8)) as executor:
+            return list(executor.map(lambda action: self._run_action(action[0], action[1], allowed_tools), actions))
+    
+    def _run_action(self, tool_name: str, args_str: str, allowed_tools: Optional[List[str]] = None) -> ActionResult:
+        """Parse arguments for one tool Action and execute it"""
         # Check tool permissions
         if allowed_tools is not None and tool_name not in allowed_tools:
-            return {'type': 'error', 'error': f'Tool {tool_name} is not allowed'}
+            return ActionResult('error', error=f'Tool {tool_name} is not allowed')
         
         # Get tool function
         tool_func = self.tools.get(tool_name)
         if not tool_func:
-            return {'type': 'error', 'error': f'Unknown tool: {tool_name}'}
+            return ActionResult('error', error=f'Unknown tool: {tool_name}')
         
-        # Parse arguments
-        try:
-            args = json.loads(args_str)
-        except json.JSONDecodeError:
+        # Parse arguments, only attempting JSON when it can be a JSON object
+        args = None
+        if args_str.startswith('{'):
+            try:
+                args = _json_loads(args_str)
+            except json.JSONDecodeError:
+                pass
+        if args is None:
             # Try simple key-value pair parsing
-            args = {}
-            kv_pattern = r'(\w+)\s*[:=]\s*"([^"]+)"'
-            for match in re.finditer(kv_pattern, args_str):
-                args[match.group(1)] = match.group(2)
-            
+            args = {key: value for key, value in self._KV_RE.findall(args_str)}
             if not args:
-                return {'type': 'error', 'error': f'Unable to parse Action arguments: {args_str}'}
+                return ActionResult('error', error=f'Unable to parse Action arguments: {args_str}')
+        
+        cache_key = None
+        if tool_name in self.tool_cacheable:
+            cache_key = (tool_name, json.dumps(args, sort_keys=True, default=str))
+            cached = self._tool_cache.get(cache_key)
+            if cached is not None:
+                return ActionResult('tool', tool_name, args, cached)
         
         # Execute tool
         try:
             result = tool_func(args)
-            return {'type': 'tool', 'tool_name': tool_name, 'args': args, 'result': result}
+            if cache_key is not None and result is not None:
+                self._tool_cache.put(cache_key, result)
+            return ActionResult('tool', tool_name, args, result)
         except Exception as e:
             logger.error(f"Tool {tool_name} execution failed: {e}")
-            return {'type': 'error', 'error': str(e), 'tool_name': tool_name}
+            return ActionResult('error', tool_name, error=str(e))
     
-    def _observe(self, action_result: Dict[str, Any]) -> str:
+    def _observe(self, action_result: ActionResult) -> str:
         """Generate Observation text"""
-        if action_result.get('type') == 'finish':
+        if action_result.type == 'tool':
+            result = action_result.result
+            result_text = str(result)
+            if isinstance(result, dict):
+                try:
+                    result_text = _json_dumps(result)
+                except TypeError:
+                    pass
+            
+            limit = self.max_obs_chars
+            if limit is not None and len(result_text) > limit:
+                result_text = f"{result_text[:limit]}... [+{len(result_text) - limit} chars truncated]"
+            return f"[Tool {action_result.tool_name}] {result_text}"
+        
+        if action_result.type == 'finish':
             return "Task completed"
         
-        if action_result.get('type') == 'error':
-            error = action_result.get('error', 'Unknown error')
-            tool_name = action_result.get('tool_name', '')
+        if action_result.type in ('error', 'no_action'):
+            error = action_result.error or 'Unknown error'
+            tool_name = action_result.tool_name
             return f"Error: {error}" + (f" (tool: {tool_name})" if tool_name else "")
         
-        if action_result.get('type') == 'tool':
-            tool_name = action_result.get('tool_name', '')
-            result = action_result.get('result', {})
-            result_text = json.dumps(result, ensure_ascii=False) if isinstance(result, dict) else str(result)
-            return f"[Tool {tool_name}] {result_text}"
-        
         return f"Unknown Action result: {action_result}"
     
     def _generate_final_answer(self, query: str, history: List[str]) -> str:
         """Generate final answer"""
-        history_text = "\n\n".join([
-            f"Observation {i+1}: {obs}" 
-            for i, obs in enumerate(history)
-        ])
+        history_text = "\n\n".join(history)
         
         prompt = f"""Based on the following observations, answer the user's question.
 
@@ -191,7 +704,7 @@ Observations:
 Please provide a concise and accurate final answer:"""
         
         try:
-            return self.llm.generate(prompt, temperature=0.3).strip()
+            return self.llm.generate(prompt, temperature=self.temperature).strip()
         except Exception as e:
             logger.error(f"Failed to generate final answer: {e}")
             return "Sorry, unable to generate final answer."